@@ -1,10 +1,18 @@
 from pathlib import Path
-import json, gc
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import json, gc, multiprocessing
 import numpy as np
+from numpy.lib import recfunctions as rfn
 from PIL import Image
 from tqdm import tqdm
 import open3d as o3d
 
+try:
+    from numba import njit, prange
+except ImportError:  # optional: fused per-pixel kernels, NumPy path otherwise
+    njit = None
+
 CFG = {
     "in_dir":  r"C:\Users\Greg\Desktop\Backupply",
     "out_dir": r"C:\Users\Greg\Desktop\pc_renders_alpha",
@@ -24,19 +32,47 @@ CFG = {
 
     "use_resume": False,
     "resume_file": r"C:\Users\Greg\Desktop\o3d_resume_index.txt",
-    "gc_every": 10,
+    # >1 renders contiguous chunks of files in parallel processes, each with its
+    # own OffscreenRenderer and resume file (<resume_file stem>_<shard>.txt)
+    "num_shards": 1,
+    # Automatic GC is off during the batch (the loop reuses its buffers and
+    # refcounting frees the rest); a full collect this often is insurance.
+    "gc_every": 500,
+
+    # PLYs parsed ahead of the renderer on a background thread
+    "prefetch": 3,
+    # Memory-map binary little-endian PLYs directly (falls back to Open3D's reader)
+    "fast_ply": True,
+    # Image encode runs in this many worker processes while the main one renders
+    "encode_workers": 2,
+    "output_format": "png",    # "png" or "webp" (lossless, fastest method)
+    "png_compress_level": 1,   # 0..9; PIL default is 6, 1 is several times faster
 
     # If your PLYs are slightly translated frame-to-frame and you want the object NOT to drift:
     "translate_to_ref_center": True,
 
+    # "depth": alpha from the depth buffer (black background behind the points).
+    # "chroma": render on the key colour and key it out; skips the depth readback,
+    # transparent pixels keep the key colour in RGB.
+    "alpha_source": "depth",
+
     # Chroma-key fallback for alpha when depth buffer is empty (keeps batch from crashing)
     "chroma_key_fallback": True,
     "chroma_key_rgb": (1.0, 0.0, 1.0),   # magenta
     "chroma_tol": 0.0,                  # tolerance in float space (0..1)
+
+    # Fuse brightness + alpha + RGBA packing into one parallel pass (if numba is installed)
+    "use_numba": True,
 }
 
-def _read_resume():
+def _resume_path(shard=None) -> Path:
     p = Path(CFG["resume_file"])
+    if shard is None:
+        return p
+    return p.with_name(f"{p.stem}_{shard}{p.suffix}")
+
+def _read_resume(shard=None):
+    p = _resume_path(shard)
     if not p.exists():
         return None
     try:
@@ -44,9 +80,17 @@ def _read_resume():
     except Exception:
         return None
 
-def _write_resume(next_index: int):
+def _write_resume(next_index: int, shard=None):
     try:
-        Path(CFG["resume_file"]).write_text(str(next_index), encoding="utf-8")
+        _resume_path(shard).write_text(str(next_index), encoding="utf-8")
+    except Exception:
+        pass
+
+def _log_skip(log_path: Path, msg: str):
+    print(msg)
+    try:
+        with log_path.open("a", encoding="utf-8") as f:
+            f.write(msg + "\n")
     except Exception:
         pass
 
@@ -76,213 +120,552 @@ def _load_view():
 
     return params, (width, height), ref_center
 
-def _ensure_colors(pcd: o3d.geometry.PointCloud) -> o3d.geometry.PointCloud:
-    if not pcd.has_colors():
-        pcd.colors = o3d.utility.Vector3dVector(
-            np.ones((len(pcd.points), 3), dtype=np.float64)
-        )
-    return pcd
-
-def _set_constant_clipping_if_available(ctr):
-    # These exist on many Open3D builds; if not, we just skip.
-    for name, val in [("set_constant_z_near", 0.01), ("set_constant_z_far", 100000.0)]:
-        fn = getattr(ctr, name, None)
-        if callable(fn):
-            try:
-                fn(val)
-            except Exception:
-                pass
-
-def _pump(vis, n=6):
-    for _ in range(int(n)):
-        vis.poll_events()
-        vis.update_renderer()
-
-def _capture_rgb_depth(vis, settle_frames=6):
-    _pump(vis, settle_frames)
-    rgb = np.asarray(vis.capture_screen_float_buffer(do_render=True))
-    dep = np.asarray(vis.capture_depth_float_buffer(do_render=True))
-    rgb8 = (np.clip(rgb, 0, 1) * 255.0).astype(np.uint8)
-    alpha = np.where(dep > 0, 255, 0).astype(np.uint8)
-    return rgb, rgb8, alpha  # return float rgb too (for chroma tests)
-
-def _chroma_key_alpha(vis, opt, settle_frames=6):
-    # Render once with magenta background, then key it out.
+def _colors_to_u8(cols):
+    # Colours travel as (N, 3) uint8 until the tensor boundary on the render thread.
+    return np.round(np.clip(cols, 0.0, 1.0) * 255.0).astype(np.uint8)
+
+def _pick_device():
+    if o3d.core.cuda.is_available():
+        return o3d.core.Device("CUDA:0")
+    return o3d.core.Device("CPU:0")
+
+def _voxel_down_sample(pts, cols_u8, voxel_size: float):
+    # Tensor voxel grid: runs on CUDA when available, colours averaged per voxel
+    # in float on the device and brought back as uint8.
+    device = _pick_device()
+    pcd_t = o3d.t.geometry.PointCloud(device)
+    pcd_t.point.positions = o3d.core.Tensor.from_numpy(pts).to(device)
+    pcd_t.point.colors = o3d.core.Tensor.from_numpy(cols_u8).to(device).to(o3d.core.float32)
+    pcd_t = pcd_t.voxel_down_sample(voxel_size)
+    cols_t = (pcd_t.point.colors + 0.5).to(o3d.core.uint8)
+    return pcd_t.point.positions.cpu().numpy(), cols_t.cpu().numpy()
+
+_PLY_DTYPES = {
+    "char": "i1", "int8": "i1", "uchar": "u1", "uint8": "u1",
+    "short": "<i2", "int16": "<i2", "ushort": "<u2", "uint16": "<u2",
+    "int": "<i4", "int32": "<i4", "uint": "<u4", "uint32": "<u4",
+    "float": "<f4", "float32": "<f4", "double": "<f8", "float64": "<f8",
+}
+
+def _fast_read_ply(path: Path):
+    # Memory-maps the vertex block of a binary little-endian PLY as a
+    # structured array. Handles the layout the scanner writes (vertex element
+    # first, scalar properties); returns None for anything else so the caller
+    # can fall back to Open3D's reader.
+    with open(path, "rb") as f:
+        if f.readline().strip() != b"ply":
+            return None
+        header = []
+        for _ in range(256):
+            line = f.readline()
+            if not line:
+                return None
+            line = line.decode("ascii", "replace").strip()
+            if line == "end_header":
+                break
+            header.append(line.split())
+        else:
+            return None
+        offset = f.tell()
+
+    fmt, n, fields, in_vertex = None, None, [], False
+    try:
+        for parts in header:
+            if not parts:
+                continue
+            if parts[0] == "format":
+                fmt = parts[1]
+            elif parts[0] == "element":
+                if n is None:
+                    if parts[1] != "vertex":
+                        return None
+                    n, in_vertex = int(parts[2]), True
+                else:
+                    in_vertex = False
+            elif parts[0] == "property" and in_vertex:
+                if parts[1] not in _PLY_DTYPES:  # list properties, unknown types
+                    return None
+                fields.append((parts[2], _PLY_DTYPES[parts[1]]))
+
+        names = [name for name, _ in fields]
+        if (fmt != "binary_little_endian" or n is None or n < 0
+                or not {"x", "y", "z"} <= set(names)):
+            return None
+        dtype = np.dtype(fields)
+    except (ValueError, IndexError):  # malformed header: let Open3D deal with it
+        return None
+    if path.stat().st_size < offset + n * dtype.itemsize:
+        return None
+    if n == 0:
+        return np.empty((0, 3), dtype=np.float64), None
+
+    # Always copy out of the read-only map: when the field dtypes already match,
+    # structured_to_unstructured would otherwise hand back a view into it.
+    vtx = np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(n,))
+    pts = rfn.structured_to_unstructured(
+        vtx[["x", "y", "z"]], dtype=np.float64, copy=True)
+
+    cols = None
+    if {"red", "green", "blue"} <= set(names):
+        cols = rfn.structured_to_unstructured(vtx[["red", "green", "blue"]], copy=True)
+        if np.issubdtype(cols.dtype, np.floating):
+            cols = _colors_to_u8(cols)
+        elif cols.dtype != np.uint8:  # wider integer channels are 0..255 values too
+            cols = np.clip(cols, 0, 255).astype(np.uint8)
+    del vtx
+    return pts, cols
+
+def _prepare_pcd(ply: Path, ref_center):
+    # Runs on the prefetch thread: read -> colors -> voxel -> translate.
+    fast = _fast_read_ply(ply) if bool(CFG.get("fast_ply", True)) else None
+    if fast is not None:
+        pts, cols = fast
+        if len(pts) == 0:
+            return None
+    else:
+        pcd = o3d.io.read_point_cloud(str(ply))
+        if pcd.is_empty():
+            return None
+        pts = np.asarray(pcd.points)
+        cols = _colors_to_u8(np.asarray(pcd.colors)) if pcd.has_colors() else None
+
+    if cols is None:
+        cols = np.full((len(pts), 3), 255, dtype=np.uint8)
+
+    if CFG["voxel_size"] and float(CFG["voxel_size"]) > 0:
+        pts, cols = _voxel_down_sample(pts, cols, float(CFG["voxel_size"]))
+
+    # One mean + one in-place add instead of separate get_center() and
+    # translate() sweeps over the points.
+    if bool(CFG.get("translate_to_ref_center", False)) and ref_center is not None:
+        pts += ref_center - pts.mean(axis=0)
+
+    # Hand back contiguous float32 positions (the layout Filament uploads) and
+    # uint8 colours, so the render thread can wrap both as tensors directly.
+    return (np.ascontiguousarray(pts, dtype=np.float32),
+            np.ascontiguousarray(cols, dtype=np.uint8))
+
+def _output_ext():
+    fmt = str(CFG.get("output_format", "png")).lower()
+    if fmt not in ("png", "webp"):
+        raise SystemExit(f"Unsupported output_format: {fmt!r} (use 'png' or 'webp')")
+    return f".{fmt}"
+
+def _save_frame(rgba, out_path: Path, compress_level=1):
+    # Runs in an encode worker process; keep it top-level so it pickles.
+    img = Image.fromarray(rgba, mode="RGBA")
+    if out_path.suffix.lower() == ".webp":
+        img.save(out_path, format="WEBP", lossless=True, exact=True, quality=0, method=0)
+    else:
+        img.save(out_path, format="PNG", compress_level=compress_level, optimize=False)
+
+def _set_constant_clipping_if_available(renderer, params):
+    # Lock near/far so the projection never follows the geometry bounds.
+    # Older Open3D builds lack set_projection on the camera; if so, we just skip.
+    fn = getattr(renderer.scene.camera, "set_projection", None)
+    if callable(fn):
+        intr = params.intrinsic
+        try:
+            fn(intr.intrinsic_matrix, 0.01, 100000.0,
+               float(intr.width), float(intr.height))
+        except Exception:
+            pass
+
+def _apply_camera(renderer, params):
+    renderer.setup_camera(params.intrinsic, params.extrinsic)
+    _set_constant_clipping_if_available(renderer, params)
+
+_COPY_NOTED = set()
+
+def _image_view(img, what: str):
+    # o3d.geometry.Image exposes the buffer protocol, so np.asarray should wrap
+    # the readback in place. If this build copies instead, say so once.
+    arr = np.asarray(img)
+    if arr.flags.owndata and what not in _COPY_NOTED:
+        _COPY_NOTED.add(what)
+        print(f"NOTE: this Open3D build copies the {what} readback into NumPy")
+    return arr
+
+def _capture_rgb(renderer):
+    # Filament renders and reads back synchronously here; OffscreenRenderer
+    # exposes no GL context or swap chain, so readback can't be pipelined with
+    # PBOs. Latency is hidden instead by the prefetch and encode pools.
+    return _image_view(renderer.render_to_image(), "RGB")
+
+def _capture_depth(renderer):
+    # View-space depth; background pixels come back as +inf.
+    return _image_view(renderer.render_to_depth_image(z_in_view_space=True), "depth")
+
+def _key_params():
     key = np.array(CFG["chroma_key_rgb"], dtype=np.float64)
+    key_u8 = np.round(np.clip(key, 0, 1) * 255.0).astype(np.uint8)
+    tol_u8 = int(round(float(CFG["chroma_tol"]) * 255.0))
+    return key_u8, tol_u8
+
+def _key_alpha(rgb_u8, key_u8, tol_u8: int):
+    # Mask: pixels NOT close to the key colour => foreground
+    if tol_u8 == 0:
+        mask = (rgb_u8 != key_u8).any(axis=2)
+    else:
+        diff = np.abs(rgb_u8.astype(np.int16) - key_u8).max(axis=2)
+        mask = diff > tol_u8
+    alpha = mask.view(np.uint8) * np.uint8(255)
+    return alpha
 
-    # Save + set background
-    bg_orig = np.array(opt.background_color, dtype=np.float64)
-    opt.background_color = key
+def _chroma_key_alpha(renderer):
+    # Render once with magenta background, then key it out.
+    renderer.scene.set_background([*CFG["chroma_key_rgb"], 1.0])
+    rgb_u8 = _capture_rgb(renderer)
+    renderer.scene.set_background([0.0, 0.0, 0.0, 1.0])
+    return _key_alpha(rgb_u8, *_key_params())
+
+if njit is not None:
+    # Single fused pass per frame: brightness LUT, alpha test and RGBA packing,
+    # rows split across threads. Both return the number of opaque pixels.
+    # (No fastmath: it would let the compiler assume depth is never inf.)
+    # cache=True keeps the compiled code on disk across runs.
+    @njit(parallel=True, cache=True)
+    def _rgba_from_depth_nb(rgb, dep, lut, out):
+        h, w = dep.shape
+        opaque = np.zeros(h, dtype=np.int64)
+        for y in prange(h):
+            for x in range(w):
+                out[y, x, 0] = lut[rgb[y, x, 0]]
+                out[y, x, 1] = lut[rgb[y, x, 1]]
+                out[y, x, 2] = lut[rgb[y, x, 2]]
+                if np.isfinite(dep[y, x]):
+                    out[y, x, 3] = 255
+                    opaque[y] += 1
+                else:
+                    out[y, x, 3] = 0
+        return opaque.sum()
+
+    @njit(parallel=True, cache=True)
+    def _rgba_from_key_nb(rgb, key, tol, lut, out):
+        h, w = rgb.shape[0], rgb.shape[1]
+        opaque = np.zeros(h, dtype=np.int64)
+        for y in prange(h):
+            for x in range(w):
+                d = 0
+                for c in range(3):
+                    v = rgb[y, x, c]
+                    out[y, x, c] = lut[v]
+                    e = abs(np.int32(v) - np.int32(key[c]))
+                    if e > d:
+                        d = e
+                if d > tol:
+                    out[y, x, 3] = 255
+                    opaque[y] += 1
+                else:
+                    out[y, x, 3] = 0
+        return opaque.sum()
+
+def _compile_frame_builder(H: int, W: int, brightness: float, use_chroma: bool):
+    # Everything that shapes the per-frame image work is fixed once the view is
+    # loaded: resolve the LUT, key colour, kernel and scratch buffers up front
+    # and return frame_fn(rgb8, dep, out) -> opaque pixel count, which writes
+    # brightness-adjusted RGB + alpha into `out` (dep is unused for chroma).
+    lut = np.clip(
+        np.arange(256, dtype=np.float32) * float(brightness), 0, 255
+    ).astype(np.uint8)
+    key_u8, tol_u8 = _key_params()
+
+    if njit is not None and bool(CFG.get("use_numba", True)):
+        if use_chroma:
+            def frame_fn(rgb8, dep, out):
+                return int(_rgba_from_key_nb(rgb8, key_u8, tol_u8, lut, out))
+        else:
+            def frame_fn(rgb8, dep, out):
+                return int(_rgba_from_depth_nb(rgb8, dep, lut, out))
+
+        # Specialise for this frame shape now (or load it from the on-disk
+        # cache) rather than stalling on the first real frame.
+        frame_fn(np.zeros((H, W, 3), dtype=np.uint8),
+                 np.zeros((H, W), dtype=np.float32),
+                 np.empty((H, W, 4), dtype=np.uint8))
+        return frame_fn
+
+    lut = None if brightness == 1.0 else lut
+    mask_buf = np.empty((H, W), dtype=bool)
+
+    if use_chroma:
+        def frame_fn(rgb8, dep, out):
+            alpha = _key_alpha(rgb8, key_u8, tol_u8)
+            out[..., :3] = rgb8 if lut is None else lut[rgb8]
+            out[..., 3] = alpha
+            return int(np.count_nonzero(alpha))
+    else:
+        def frame_fn(rgb8, dep, out):
+            out[..., :3] = rgb8 if lut is None else lut[rgb8]
+            np.isfinite(dep, out=mask_buf)
+            np.multiply(mask_buf.view(np.uint8), np.uint8(255), out=out[..., 3])
+            return int(np.count_nonzero(mask_buf))
+    return frame_fn
+
+def _render_files(files, start: int, shard=None) -> int:
+    # The render loop proper; `start` is the global index of files[0].
+    # Returns how many files had geometry (rendered now or already on disk).
+    out_dir = Path(CFG["out_dir"])
+    out_ext = _output_ext()
 
-    _pump(vis, settle_frames)
-    rgb_key = np.asarray(vis.capture_screen_float_buffer(do_render=True))
+    base_params, (view_w, view_h), ref_center = _load_view()
+    CFG["width"], CFG["height"] = int(view_w), int(view_h)
 
-    # Restore background
-    opt.background_color = bg_orig
-    _pump(vis, 2)
+    # Headless Filament renderer: no window, no event pump, one render per capture.
+    renderer = o3d.visualization.rendering.OffscreenRenderer(
+        int(CFG["width"]), int(CFG["height"])
+    )
+    # No tone mapping / colour grading / FXAA: unlit vertex colours and the
+    # chroma key colour must come back exactly as written.
+    renderer.scene.view.set_post_processing(False)
+    # Chroma as the primary alpha source renders straight onto the key colour,
+    # so one render gives both RGB and alpha.
+    alpha_source = str(CFG.get("alpha_source", "depth")).lower()
+    if alpha_source not in ("depth", "chroma"):
+        raise SystemExit(f"Unsupported alpha_source: {alpha_source!r} (use 'depth' or 'chroma')")
+    chroma_primary = alpha_source == "chroma"
+    if chroma_primary:
+        renderer.scene.set_background([*CFG["chroma_key_rgb"], 1.0])
+    else:
+        renderer.scene.set_background([0.0, 0.0, 0.0, 1.0])
+
+    mat = o3d.visualization.rendering.MaterialRecord()
+    mat.shader = "defaultUnlit"
+    mat.point_size = float(CFG["point_size"])
+
+    update_flags = (o3d.visualization.rendering.Scene.UPDATE_POINTS_FLAG
+                    | o3d.visualization.rendering.Scene.UPDATE_COLORS_FLAG)
+    n_drawn = -1  # point count of the geometry currently in the scene
+    n_rendered = 0
+    n_existing = 0
 
-    # Mask: pixels NOT close to magenta => foreground
-    diff = np.abs(rgb_key - key[None, None, :]).max(axis=2)
-    mask = diff > float(CFG["chroma_tol"])
-    alpha = (mask.astype(np.uint8) * 255)
-    return alpha
+    empty_log = out_dir / "_empty_frames.txt"
+
+    # Renders come back as uint8, so brightness is a 256-entry lookup folded
+    # into the frame builder together with the alpha test and RGBA packing.
+    frame_fn = _compile_frame_builder(
+        int(CFG["height"]), int(CFG["width"]),
+        float(CFG["brightness"]), chroma_primary,
+    )
+
+    # Overlap disk with rendering: PLYs are parsed ahead on io_pool while the
+    # main thread renders, and image encode/write runs behind it in enc_pool
+    # processes (deflate is CPU-bound, so threads would fight over the GIL).
+    io_pool = ThreadPoolExecutor(max_workers=2)
+    # Workers start lazily, once prefetch/Filament/Numba threads are running;
+    # forking a threaded process can deadlock the child, so always spawn
+    # (the Windows default anyway).
+    enc_pool = ProcessPoolExecutor(
+        max_workers=int(CFG["encode_workers"]),
+        mp_context=multiprocessing.get_context("spawn"),
+    )
+    futures = {}
+    saves = deque()  # (idx, future) of in-flight saves, oldest first
+
+    # Preallocated RGBA output; each in-flight save owns one slot of the ring.
+    # A slot is only refilled once its save has completed, by which point the
+    # pool has already pickled it over to the worker, so no per-frame copy.
+    max_backlog = 2 * int(CFG["encode_workers"])
+    rgba_ring = [
+        np.empty((int(CFG["height"]), int(CFG["width"]), 4), dtype=np.uint8)
+        for _ in range(max_backlog)
+    ]
+    n_saved = 0
+
+    # Frames already on disk, from one directory listing instead of a stat per file.
+    done = {p.stem for p in out_dir.glob(f"*{out_ext}")}
+
+    def _prefetch(j):
+        if j >= len(files) or j in futures:
+            return
+        if files[j].stem in done:
+            return
+        futures[j] = io_pool.submit(_prepare_pcd, files[j], ref_center)
+
+    for j in range(int(CFG["prefetch"])):
+        _prefetch(j)
+
+    # The resume file only moves past a frame once its save (and every save
+    # ahead of it) has completed; until then it points at the oldest pending one.
+    next_resume = start
+
+    def _mark(next_index=None):
+        nonlocal next_resume
+        if next_index is not None:
+            next_resume = next_index
+        _write_resume(saves[0][0] if saves else next_resume, shard)
+
+    def _pop_save():
+        saves[0][1].result()  # also surfaces write errors
+        saves.popleft()
+        _mark()
+
+    gc.disable()
+    try:
+        progress = tqdm(files, position=shard or 0,
+                        desc=None if shard is None else f"shard {shard}")
+        for k, ply in enumerate(progress, start=0):
+            idx = start + k
+            _prefetch(k + int(CFG["prefetch"]))
+
+            if ply.stem in done:
+                n_existing += 1
+                _mark(idx + 1)
+                continue
+            out_path = out_dir / f"{ply.stem}{out_ext}"
+
+            fut = futures.pop(k, None)
+            if fut is None:
+                fut = io_pool.submit(_prepare_pcd, ply, ref_center)
+            # A file that fails to load is skipped + logged (don’t die mid-batch)
+            try:
+                result = fut.result()
+            except Exception as e:
+                _log_skip(empty_log, f"LOAD_FAILED idx={idx} file={ply.name} err={e!r}")
+                _mark(idx + 1)
+                continue
+            if result is None:
+                _mark(idx + 1)
+                continue
+            points_np, colors_np = result
+
+            # Filament uploads float32 positions/colours from CPU tensors. Positions
+            # arrive in that layout, so from_numpy shares them; uint8 colours are
+            # widened to [0, 1] floats here, at the boundary.
+            pcd_t = o3d.t.geometry.PointCloud(o3d.core.Device("CPU:0"))
+            pcd_t.point.positions = o3d.core.Tensor.from_numpy(points_np)
+            pcd_t.point.colors = o3d.core.Tensor.from_numpy(
+                colors_np.astype(np.float32) * np.float32(1.0 / 255.0))
+
+            # Same point count: update the existing buffers in place.
+            # Otherwise Filament needs a fresh mesh, so swap the geometry.
+            n_points = len(points_np)
+            if n_points == n_drawn:
+                renderer.scene.scene.update_geometry("pcd", pcd_t, update_flags)
+            else:
+                if renderer.scene.has_geometry("pcd"):
+                    renderer.scene.remove_geometry("pcd")
+                renderer.scene.add_geometry("pcd", pcd_t, mat)
+                n_drawn = n_points
+
+            # The camera is fixed: apply it once the first geometry is in the scene,
+            # then only resync occasionally instead of rebuilding it every frame.
+            if n_rendered % 100 == 0:
+                _apply_camera(renderer, base_params)
+            n_rendered += 1
+
+            # Bound the encode backlog
+            while len(saves) >= max_backlog:
+                _pop_save()
+
+            # Next ring slot; its previous save has finished, so fill it in place.
+            rgba_buf = rgba_ring[n_saved % max_backlog]
+
+            # Capture; depth is only read back when it is the alpha source.
+            # Brightness and alpha are written straight into the ring slot.
+            rgb8 = _capture_rgb(renderer)
+            if chroma_primary:
+                opaque = frame_fn(rgb8, None, rgba_buf)
+            else:
+                dep = _capture_depth(renderer)
+                opaque = frame_fn(rgb8, dep, rgba_buf)
+
+                # If depth is empty, fallback to chroma-key alpha (instead of crashing)
+                if opaque == 0 and bool(CFG.get("chroma_key_fallback", True)):
+                    try:
+                        alpha = _chroma_key_alpha(renderer)
+                        rgba_buf[..., 3] = alpha
+                        opaque = int(np.count_nonzero(alpha))
+                    except Exception:
+                        pass  # keep zeros
+
+            # If STILL empty: skip + log (don’t die mid-batch)
+            if opaque == 0:
+                _log_skip(empty_log, f"EMPTY_FRAME idx={idx} file={ply.name}")
+                _mark(idx + 1)
+                continue
+
+            saves.append((idx, enc_pool.submit(
+                _save_frame, rgba_buf, out_path, int(CFG["png_compress_level"])
+            )))
+            n_saved += 1
+
+            _mark(idx + 1)
+
+            del result, points_np, colors_np, pcd_t
+            if CFG["gc_every"] and ((k + 1) % int(CFG["gc_every"]) == 0):
+                gc.collect()
+
+        while saves:
+            _pop_save()
+    finally:
+        # Also runs when the loop raises: shutdown(wait=True) lets queued saves
+        # finish, drops pending prefetches, and GC comes back on either way.
+        io_pool.shutdown(wait=True, cancel_futures=True)
+        enc_pool.shutdown(wait=True)
+        gc.enable()
+
+    del renderer
+    return n_rendered + n_existing
+
+def _render_shard(cfg, shard: int, start: int, files):
+    # Shard process entry point: adopt the parent's CFG, resume, render.
+    CFG.update(cfg)
+    if bool(CFG.get("use_resume", False)):
+        r = _read_resume(shard)
+        if r is not None and r > start:
+            files = files[r - start:]
+            start = r
+    return _render_files(files, start, shard)
 
 def main():
     in_dir = Path(CFG["in_dir"])
     out_dir = Path(CFG["out_dir"])
     out_dir.mkdir(parents=True, exist_ok=True)
+    _output_ext()  # fail early on a bad output_format
 
     files = sorted(in_dir.glob(CFG["glob"]))
     if not files:
         raise SystemExit(f"No PLY files found in {in_dir} with glob {CFG['glob']}")
 
-    base_params, (view_w, view_h), ref_center = _load_view()
-    CFG["width"], CFG["height"] = int(view_w), int(view_h)
+    num_shards = max(1, int(CFG.get("num_shards", 1)))
+    if num_shards == 1:
+        start = 0
+        if bool(CFG.get("use_resume", False)):
+            r = _read_resume()
+            if r is not None and r >= 0:
+                start = r
+
+        files = files[start:]
+        if CFG["max_files"] and int(CFG["max_files"]) > 0:
+            files = files[: int(CFG["max_files"])]
+
+        print(f"Rendering {len(files)} files starting at index {start}")
+        print(f"Output -> {out_dir}")
+        if _render_files(files, start) == 0:
+            raise SystemExit("All PLY files were empty; nothing to render.")
+        print("Done.")
+        return
 
-    start = 0
-    if bool(CFG.get("use_resume", False)):
-        r = _read_resume()
-        if r is not None and r >= 0:
-            start = r
-
-    files = files[start:]
     if CFG["max_files"] and int(CFG["max_files"]) > 0:
         files = files[: int(CFG["max_files"])]
 
-    print(f"Rendering {len(files)} files starting at index {start}")
-    print(f"Output -> {out_dir}")
-    print("IMPORTANT: Leave the Open3D window OPEN and NOT minimized while it runs.")
-    print("IMPORTANT: Do NOT resize the Open3D window during rendering (keeps camera stable).")
-
-    vis = o3d.visualization.Visualizer()
-    vis.create_window(
-        "Open3D Batch Renderer (do not minimize)",
-        width=int(CFG["width"]),
-        height=int(CFG["height"]),
-        visible=True
-    )
+    # Frames are independent under a fixed camera: split the list into
+    # contiguous chunks, one renderer per process, per-shard resume files.
+    # (ProcessPoolExecutor rather than multiprocessing.Pool: Pool workers are
+    # daemonic and could not start their own encode pool.)
+    size = -(-len(files) // num_shards)
+    chunks = [(i, i * size, files[i * size:(i + 1) * size]) for i in range(num_shards)]
+    chunks = [c for c in chunks if c[2]]
 
-    opt = vis.get_render_option()
-    opt.point_size = float(CFG["point_size"])
-    opt.background_color = np.array([0.0, 0.0, 0.0], dtype=np.float64)
-    opt.light_on = True
-
-    # Keep ONE geometry alive; update it in-place.
-    pcd_draw = o3d.geometry.PointCloud()
-
-    # Seed geometry so add_geometry works once.
-    seeded = False
-    seed_path = None
-    for sp in files:
-        seed = o3d.io.read_point_cloud(str(sp))
-        if seed.is_empty():
-            continue
-        if CFG["voxel_size"] and float(CFG["voxel_size"]) > 0:
-            seed = seed.voxel_down_sample(float(CFG["voxel_size"]))
-        seed = _ensure_colors(seed)
-        pcd_draw.points = seed.points
-        pcd_draw.colors = seed.colors
-        seeded = True
-        seed_path = sp
-        break
-
-    if not seeded:
+    print(f"Rendering {len(files)} files across {len(chunks)} shards")
+    print(f"Output -> {out_dir}")
+    with ProcessPoolExecutor(max_workers=len(chunks)) as pool:
+        jobs = [pool.submit(_render_shard, dict(CFG), i, base, chunk)
+                for i, base, chunk in chunks]
+        n_with_geometry = sum(job.result() for job in jobs)
+    if n_with_geometry == 0:
         raise SystemExit("All PLY files were empty; nothing to render.")
-
-    # KEY CHANGE:
-    # We allow ONE reset_bounding_box=True here ONLY to initialize near/far planes.
-    # Then we lock the camera params and never reset bbox again.
-    vis.add_geometry(pcd_draw, reset_bounding_box=True)
-
-    ctr = vis.get_view_control()
-
-    # Warmup a bit (helps on some Windows/OpenGL setups)
-    _pump(vis, 20)
-
-    # Apply saved camera and lock clipping (if available)
-    ctr.convert_from_pinhole_camera_parameters(base_params, allow_arbitrary=True)
-    _set_constant_clipping_if_available(ctr)
-    _pump(vis, 10)
-
-    # Optional: if you want to guarantee the first frame matches your capture PLY:
-    # (this doesn’t change view; it just prints what it seeded from)
-    if seed_path is not None:
-        print(f"Seeded geometry from: {seed_path.name}")
-
-    empty_log = out_dir / "_empty_frames.txt"
-
-    for k, ply in enumerate(tqdm(files), start=0):
-        idx = start + k
-        out_path = out_dir / f"{ply.stem}.png"
-        if out_path.exists():
-            _write_resume(idx + 1)
-            continue
-
-        pcd = o3d.io.read_point_cloud(str(ply))
-        if pcd.is_empty():
-            _write_resume(idx + 1)
-            continue
-
-        if CFG["voxel_size"] and float(CFG["voxel_size"]) > 0:
-            pcd = pcd.voxel_down_sample(float(CFG["voxel_size"]))
-
-        pcd = _ensure_colors(pcd)
-
-        if bool(CFG.get("translate_to_ref_center", False)) and ref_center is not None:
-            new_center = np.array(pcd.get_center(), dtype=np.float64)
-            pcd.translate(ref_center - new_center, relative=True)
-
-        # Update existing geometry (NO clear/add)
-        pcd_draw.points = pcd.points
-        pcd_draw.colors = pcd.colors
-        vis.update_geometry(pcd_draw)
-
-        # Re-apply exact camera (prevents drift)
-        ctr.convert_from_pinhole_camera_parameters(base_params, allow_arbitrary=True)
-        _set_constant_clipping_if_available(ctr)
-
-        # Capture (depth-based alpha)
-        rgb_float, rgb8, alpha = _capture_rgb_depth(vis, settle_frames=6)
-
-        # If depth is empty, try again with more settle frames
-        if alpha.max() == 0:
-            rgb_float, rgb8, alpha = _capture_rgb_depth(vis, settle_frames=20)
-
-        # If still empty, fallback to chroma-key alpha (instead of crashing)
-        if alpha.max() == 0 and bool(CFG.get("chroma_key_fallback", True)):
-            try:
-                alpha = _chroma_key_alpha(vis, opt, settle_frames=10)
-            except Exception:
-                alpha = alpha  # keep zeros
-
-        # If STILL empty: skip + log (don’t die mid-batch)
-        if alpha.max() == 0:
-            msg = f"EMPTY_FRAME idx={idx} file={ply.name}\n"
-            print(msg.strip())
-            try:
-                with empty_log.open("a", encoding="utf-8") as f:
-                    f.write(msg)
-            except Exception:
-                pass
-            _write_resume(idx + 1)
-            continue
-
-        if CFG["brightness"] != 1.0:
-            rgb8 = np.clip(
-                rgb8.astype(np.float32) * float(CFG["brightness"]),
-                0, 255
-            ).astype(np.uint8)
-
-        rgba = np.dstack([rgb8, alpha])
-        Image.fromarray(rgba, mode="RGBA").save(out_path)
-
-        _write_resume(idx + 1)
-
-        del pcd
-        if CFG["gc_every"] and ((k + 1) % int(CFG["gc_every"]) == 0):
-            gc.collect()
-
-    vis.destroy_window()
     print("Done.")
 
 if __name__ == "__main__":
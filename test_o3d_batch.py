@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("open3d")
+import o3d_batch
+
+
+def _write_ply(path, vertex_props, rows, header_extra=""):
+    header = "ply\nformat binary_little_endian 1.0\n"
+    header += f"element vertex {len(rows)}\n"
+    header += "".join(f"property {t} {name}\n" for name, t, _ in vertex_props)
+    header += header_extra + "end_header\n"
+    dtype = np.dtype([(name, np_t) for name, _, np_t in vertex_props])
+    body = np.array([tuple(r) for r in rows], dtype=dtype).tobytes()
+    path.write_bytes(header.encode("ascii") + body)
+
+
+@pytest.mark.parametrize("ply_type, np_type", [("float", "<f4"), ("double", "<f8")])
+def test_fast_read_ply_roundtrip(tmp_path, ply_type, np_type):
+    props = [("x", ply_type, np_type), ("y", ply_type, np_type), ("z", ply_type, np_type),
+             ("red", "uchar", "u1"), ("green", "uchar", "u1"), ("blue", "uchar", "u1")]
+    rows = [(i * 0.5, -i, 2.0 * i, i, 10 + i, 255 - i) for i in range(5)]
+    path = tmp_path / "cloud.ply"
+    _write_ply(path, props, rows)
+
+    pts, cols = o3d_batch._fast_read_ply(path)
+
+    np.testing.assert_allclose(pts, np.array([r[:3] for r in rows], dtype=np.float64))
+    np.testing.assert_array_equal(cols, np.array([r[3:] for r in rows], dtype=np.uint8))
+    assert pts.dtype == np.float64 and cols.dtype == np.uint8
+    # Must not be views into the read-only memmap: the loader recentres in place.
+    pts += 1.0
+    cols[0, 0] = 0
+
+
+@pytest.mark.parametrize("ply_type, np_type, rgb, expected", [
+    ("int", "<i4", (10, 20, 300), (10, 20, 255)),
+    ("ushort", "<u2", (0, 128, 255), (0, 128, 255)),
+    ("float", "<f4", (0.0, 0.5, 1.0), (0, 128, 255)),
+])
+def test_fast_read_ply_color_types(tmp_path, ply_type, np_type, rgb, expected):
+    props = [("x", "float", "<f4"), ("y", "float", "<f4"), ("z", "float", "<f4"),
+             ("red", ply_type, np_type), ("green", ply_type, np_type),
+             ("blue", ply_type, np_type)]
+    path = tmp_path / "cloud.ply"
+    _write_ply(path, props, [(0.0, 0.0, 0.0, *rgb)])
+
+    _, cols = o3d_batch._fast_read_ply(path)
+
+    np.testing.assert_array_equal(cols, np.array([expected], dtype=np.uint8))
+
+
+def test_fast_read_ply_without_colors(tmp_path):
+    props = [("x", "double", "<f8"), ("y", "double", "<f8"), ("z", "double", "<f8")]
+    path = tmp_path / "cloud.ply"
+    _write_ply(path, props, [(1.0, 2.0, 3.0)])
+
+    pts, cols = o3d_batch._fast_read_ply(path)
+
+    np.testing.assert_array_equal(pts, [[1.0, 2.0, 3.0]])
+    assert cols is None
+
+
+@pytest.mark.parametrize("header", [
+    "ply\nformat binary_little_endian 1.0\nelement vertex many\n"
+    "property float x\nproperty float y\nproperty float z\nend_header\n",
+    "ply\nformat binary_little_endian 1.0\nelement vertex 1\n"
+    "property float x\nproperty float x\nproperty float y\nproperty float z\nend_header\n",
+    "ply\nformat ascii 1.0\nelement vertex 1\n"
+    "property float x\nproperty float y\nproperty float z\nend_header\n",
+])
+def test_fast_read_ply_falls_back_on_unsupported_headers(tmp_path, header):
+    path = tmp_path / "cloud.ply"
+    path.write_bytes(header.encode("ascii") + b"\0" * 64)
+
+    assert o3d_batch._fast_read_ply(path) is None
+
+
+@pytest.mark.parametrize("use_chroma", [False, True])
+@pytest.mark.parametrize("chroma_tol", [0.0, 0.1])
+@pytest.mark.parametrize("brightness", [1.0, 1.4])
+def test_numba_frame_builder_matches_numpy(monkeypatch, use_chroma, chroma_tol, brightness):
+    if o3d_batch.njit is None:
+        pytest.skip("numba not installed")
+    monkeypatch.setitem(o3d_batch.CFG, "chroma_tol", chroma_tol)
+
+    H, W = 48, 64
+    rng = np.random.default_rng(0)
+    rgb = rng.integers(0, 256, (H, W, 3), dtype=np.uint8)
+    rgb[:6] = (255, 0, 255)     # exact key colour
+    rgb[6:9] = (250, 10, 240)   # within tolerance 0.1, not within 0
+    dep = rng.random((H, W)).astype(np.float32)
+    dep[dep < 0.3] = np.inf
+
+    results = []
+    for use_numba in (True, False):
+        monkeypatch.setitem(o3d_batch.CFG, "use_numba", use_numba)
+        frame_fn = o3d_batch._compile_frame_builder(H, W, brightness, use_chroma)
+        out = np.zeros((H, W, 4), dtype=np.uint8)
+        results.append((frame_fn(rgb, dep, out), out))
+
+    (n_nb, out_nb), (n_np, out_np) = results
+    assert n_nb == n_np
+    np.testing.assert_array_equal(out_nb, out_np)